@@ -88,6 +88,7 @@ class StableDiffusionGuidance(BaseObject):
 
         if self.cfg.enable_channels_last_format:
             self.pipe.unet.to(memory_format=torch.channels_last)
+            self.pipe.vae.to(memory_format=torch.channels_last)
 
         del self.pipe.text_encoder
         cleanup()
@@ -174,9 +175,13 @@ class StableDiffusionGuidance(BaseObject):
         latent_width: int = 64,
     ) -> Float[Tensor, "B 3 512 512"]:
         input_dtype = latents.dtype
-        latents = F.interpolate(
-            latents, (latent_height, latent_width), mode="bilinear", align_corners=False
-        )
+        if latents.shape[-2:] != (latent_height, latent_width):
+            latents = F.interpolate(
+                latents,
+                (latent_height, latent_width),
+                mode="bilinear",
+                align_corners=False,
+            )
         latents = 1 / self.vae.config.scaling_factor * latents
         image = self.vae.decode(latents.to(self.weights_dtype)).sample
         image = (image * 0.5 + 0.5).clamp(0, 1)
@@ -387,9 +392,13 @@ class StableDiffusionGuidance(BaseObject):
         rgb_BCHW = rgb.permute(0, 3, 1, 2)
         latents: Float[Tensor, "B 4 64 64"]
         if rgb_as_latents:
-            latents = F.interpolate(
-                rgb_BCHW, (64, 64), mode="bilinear", align_corners=False
-            )
+            # skip the resampling copy when latents are rendered at 64x64 already
+            if rgb_BCHW.shape[-2:] != (64, 64):
+                latents = F.interpolate(
+                    rgb_BCHW, (64, 64), mode="bilinear", align_corners=False
+                )
+            else:
+                latents = rgb_BCHW
         else:
             rgb_BCHW_512 = F.interpolate(
                 rgb_BCHW, (512, 512), mode="bilinear", align_corners=False
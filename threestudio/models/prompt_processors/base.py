@@ -224,6 +224,7 @@ class PromptProcessor(BaseObject):
 
     def configure(self) -> None:
         self._cache_dir = ".threestudio_cache/text_embeddings"  # FIXME: hard-coded path
+        self._prompt_utils: Optional[PromptProcessorOutput] = None
 
         # view-dependent text embeddings
         self.directions: List[DirectionConfig]
@@ -393,6 +394,7 @@ class PromptProcessor(BaseObject):
     def load_text_embeddings(self):
         # synchronize, to ensure the text embeddings have been computed and saved to cache
         barrier()
+        self._prompt_utils = None
         self.text_embeddings = self.load_from_cache(self.prompt)[None, ...]
         self.uncond_text_embeddings = self.load_from_cache(self.negative_prompt)[
             None, ...
@@ -508,7 +510,11 @@ class PromptProcessor(BaseObject):
         return Image.open(image_path)
 
     def __call__(self) -> PromptProcessorOutput:
-        return PromptProcessorOutput(
+        # the output only depends on the loaded text embeddings and the config,
+        # so it is built (and the image opened) once and reused for every step
+        if self._prompt_utils is not None:
+            return self._prompt_utils
+        self._prompt_utils = PromptProcessorOutput(
             text_embeddings=self.text_embeddings,
             uncond_text_embeddings=self.uncond_text_embeddings,
             text_embeddings_vd=self.text_embeddings_vd,
@@ -522,3 +528,4 @@ class PromptProcessor(BaseObject):
             perp_neg_f_sf=self.cfg.perp_neg_f_sf,
             image=self.get_image(self.cfg.image_path)
         )
+        return self._prompt_utils
@@ -51,9 +51,13 @@ class NeRFVolumeRenderer(VolumeRenderer):
         rays_d: Float[Tensor, "B H W 3"],
         light_positions: Float[Tensor, "B 3"],
         bg_color: Optional[Tensor] = None,
+        need_normal: bool = False,
         **kwargs
     ) -> Dict[str, Float[Tensor, "..."]]:
         batch_size, height, width = rays_o.shape[:3]
+        # normals are only computed when the material shades with them
+        # or the system explicitly asks for them, e.g. for the orientation loss
+        output_normal = self.material.requires_normal or need_normal
         rays_o_flatten: Float[Tensor, "Nr 3"] = rays_o.reshape(-1, 3)
         rays_d_flatten: Float[Tensor, "Nr 3"] = rays_d.reshape(-1, 3)
         light_positions_flatten: Float[Tensor, "Nr 3"] = (
@@ -116,9 +120,7 @@ class NeRFVolumeRenderer(VolumeRenderer):
         t_intervals = t_ends - t_starts
 
         if self.training:
-            geo_out = self.geometry(
-                positions, output_normal=self.material.requires_normal
-            )
+            geo_out = self.geometry(positions, output_normal=output_normal)
             rgb_fg_all = self.material(
                 viewdirs=t_dirs,
                 positions=positions,
@@ -132,7 +134,7 @@ class NeRFVolumeRenderer(VolumeRenderer):
                 self.geometry,
                 self.cfg.eval_chunk_size,
                 positions,
-                output_normal=self.material.requires_normal,
+                output_normal=output_normal,
             )
             rgb_fg_all = chunk_batch(
                 self.material,
@@ -232,7 +234,7 @@ class NeRFVolumeRenderer(VolumeRenderer):
                 if self.cfg.return_normal_perturb:
                     normal_perturb = self.geometry(
                         positions + torch.randn_like(positions) * 1e-2,
-                        output_normal=self.material.requires_normal,
+                        output_normal=output_normal,
                     )["normal"]
                     out.update({"normal_perturb": normal_perturb})
         else:
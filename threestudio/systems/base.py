@@ -1,4 +1,5 @@
 import os
+from collections import OrderedDict
 from dataclasses import dataclass, field
 
 import pytorch_lightning as pl
@@ -35,6 +36,8 @@ class BaseSystem(pl.LightningModule, Updateable, SaverMixin):
         self._resumed: bool = resumed
         self._resumed_eval: bool = False
         self._resumed_eval_status: dict = {"global_step": 0, "current_epoch": 0}
+        # names of submodules left out of state_dict, e.g. frozen pretrained guidance
+        self._non_persistent_modules: set = set()
         if "loggers" in cfg:
             self.create_loggers(cfg.loggers)
 
@@ -79,6 +82,22 @@ class BaseSystem(pl.LightningModule, Updateable, SaverMixin):
     def configure(self) -> None:
         pass
 
+    def state_dict(self, *args, **kwargs):
+        if not self._non_persistent_modules:
+            return super().state_dict(*args, **kwargs)
+        # hide non-persistent modules while collecting the state dict,
+        # so their tensors are never collected in the first place
+        modules = self._modules
+        self._modules = OrderedDict(
+            (name, module)
+            for name, module in modules.items()
+            if name not in self._non_persistent_modules
+        )
+        try:
+            return super().state_dict(*args, **kwargs)
+        finally:
+            self._modules = modules
+
     def post_configure(self) -> None:
         """
         executed after weights are loaded
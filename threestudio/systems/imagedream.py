@@ -23,27 +23,22 @@ class ImageDreamSystem(BaseLift3DSystem):
         super().configure()
         self.guidance = threestudio.find(self.cfg.guidance_type)(self.cfg.guidance)
         self.guidance.requires_grad_(False)
+        # frozen pretrained weights, restored from the guidance in on_load_checkpoint
+        self._non_persistent_modules.add("guidance")
         self.prompt_processor = threestudio.find(self.cfg.prompt_processor_type)(
             self.cfg.prompt_processor
         )
         self.prompt_utils = self.prompt_processor()
 
     def on_load_checkpoint(self, checkpoint):
-        for k in list(checkpoint["state_dict"].keys()):
-            if k.startswith("guidance."):
-                return
+        if any(k.startswith("guidance.") for k in checkpoint["state_dict"]):
+            return
         guidance_state_dict = {
             "guidance." + k: v for (k, v) in self.guidance.state_dict().items()
         }
         checkpoint["state_dict"] = {**checkpoint["state_dict"], **guidance_state_dict}
         return
 
-    def on_save_checkpoint(self, checkpoint):
-        for k in list(checkpoint["state_dict"].keys()):
-            if k.startswith("guidance."):
-                checkpoint["state_dict"].pop(k)
-        return
-
     def forward(self, batch: Dict[str, Any]) -> Dict[str, Any]:
         return self.renderer(**batch)
 
@@ -1,19 +1,44 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 
 import torch
 
 import threestudio
 from threestudio.systems.base import BaseLift3DSystem
-from threestudio.utils.ops import ShapeLoss, binary_cross_entropy, dot
+from threestudio.utils.config import config_to_primitive
+from threestudio.utils.misc import parse_version
+from threestudio.utils.ops import ShapeLoss
 from threestudio.utils.typing import *
 
 
+@torch.jit.script
+def _loss_orient(
+    weights: Tensor, normal: Tensor, t_dirs: Tensor, num_pos: Tensor
+) -> Tensor:
+    # fused version of (weights * dot(normal, t_dirs).clamp_min(0.0) ** 2).sum() / num_pos
+    d = (normal * t_dirs).sum(-1, keepdim=True).clamp_min(0.0)
+    return (weights * d * d).sum() / num_pos
+
+
+@torch.jit.script
+def _opacity_losses(opacity: Tensor) -> Tuple[Tensor, Tensor, Tensor]:
+    # sparsity and opaque losses, and the number of rays with positive opacity
+    # (normalizer of the orientation loss), computed in a single pass over opacity
+    loss_sparsity = torch.sqrt(opacity * opacity + 0.01).mean()
+    # binary entropy of the clamped opacity, equal to binary_cross_entropy(oc, oc)
+    oc = opacity.clamp(1.0e-3, 1.0 - 1.0e-3)
+    loss_opaque = -(oc * torch.log(oc) + (1.0 - oc) * torch.log1p(-oc)).mean()
+    num_pos = (opacity > 0).float().sum().clamp_min(1.0)
+    return loss_sparsity, loss_opaque, num_pos
+
+
 @threestudio.register("latentnerf-system")
 class LatentNeRF(BaseLift3DSystem):
     @dataclass
     class Config(BaseLift3DSystem.Config):
         guide_shape: Optional[str] = None
         refinement: bool = False
+        enable_torch_compile: bool = False
 
     cfg: Config
 
@@ -24,11 +49,53 @@ class LatentNeRF(BaseLift3DSystem):
         if self.training or not self.cfg.refinement:
             self.guidance = threestudio.find(self.cfg.guidance_type)(self.cfg.guidance)
 
+        if self.cfg.enable_torch_compile:
+            self.setup_torch_compile()
+
         if self.cfg.guide_shape is not None:
             self.shape_loss = ShapeLoss(self.cfg.guide_shape)
 
-    def forward(self, batch: Dict[str, Any], decode: bool = False) -> Dict[str, Any]:
-        render_out = self.renderer(**batch)
+        # resolve loss weight specifications once instead of converting them every step
+        self.loss_schedules: Dict[str, Any] = config_to_primitive(self.cfg.loss)
+
+        # validation and test images are written in background threads,
+        # the pool is created on first use and shut down at the end of each stage
+        self._save_pool: Optional[ThreadPoolExecutor] = None
+        self._save_futures: List[Future] = []
+
+    def setup_torch_compile(self) -> None:
+        if parse_version(torch.__version__) < parse_version("2"):
+            threestudio.warn(
+                "torch.compile requires PyTorch2.0, compilation is skipped."
+            )
+            return
+        import torch._dynamo
+        import torch._inductor.config
+
+        # avoid recompilation limits being hit by changing batch sizes and resolutions
+        torch._dynamo.config.cache_size_limit = 8192
+        # inductor settings for the convolution-heavy UNet and VAE
+        torch._inductor.config.conv_1x1_as_mm = True
+        torch._inductor.config.coordinate_descent_tuning = True
+        torch._inductor.config.epilogue_fusion = False
+        # compile the forward method in place to keep the state dict keys unchanged,
+        # number of samples per ray varies every step, so use dynamic shapes
+        # and the default mode (no CUDA graphs)
+        self.renderer.forward = torch.compile(
+            self.renderer.forward, mode="default", fullgraph=False, dynamic=True
+        )
+        if hasattr(self, "guidance"):
+            self.guidance.unet = torch.compile(
+                self.guidance.unet, mode="default", fullgraph=False, dynamic=False
+            )
+            self.guidance.vae.decode = torch.compile(
+                self.guidance.vae.decode, mode="default"
+            )
+
+    def forward(
+        self, batch: Dict[str, Any], decode: bool = False, **render_kwargs
+    ) -> Dict[str, Any]:
+        render_out = self.renderer(**batch, **render_kwargs)
         out = {
             **render_out,
         }
@@ -36,73 +103,122 @@ class LatentNeRF(BaseLift3DSystem):
             if self.cfg.refinement:
                 out["decoded_rgb"] = out["comp_rgb"]
             else:
-                out["decoded_rgb"] = self.guidance.decode_latents(
-                    out["comp_rgb"].permute(0, 3, 1, 2)
-                ).permute(0, 2, 3, 1)
+                # permuting the contiguous HWC rendering gives a channels-last BCHW view,
+                # and the decoded image is permuted back to a view as well, no copies are made
+                latents = out["comp_rgb"].permute(0, 3, 1, 2)
+                out["decoded_rgb"] = self.guidance.decode_latents(latents).permute(
+                    0, 2, 3, 1
+                )
         return out
 
+    def save_image_grid_async(self, filename, imgs, **kwargs) -> None:
+        # copy images to pinned host memory without synchronizing the device,
+        # the worker waits for the copies to finish before writing the grid
+        imgs_cpu = []
+        for item in imgs:
+            img_cpu = torch.empty(
+                item["img"].shape, dtype=item["img"].dtype, pin_memory=True
+            )
+            img_cpu.copy_(item["img"], non_blocking=True)
+            imgs_cpu.append({**item, "img": img_cpu})
+        copied = torch.cuda.Event()
+        copied.record()
+
+        def save():
+            copied.synchronize()
+            self.save_image_grid(filename, imgs_cpu, **kwargs)
+
+        if self._save_pool is None:
+            self._save_pool = ThreadPoolExecutor(max_workers=2)
+        self._save_futures.append(self._save_pool.submit(save))
+
+    def wait_image_saving(self) -> None:
+        # also re-raises exceptions from the workers, the pending list is cleared
+        # even then so that a failed save is not raised again in a later epoch
+        try:
+            for future in self._save_futures:
+                future.result()
+        finally:
+            self._save_futures = []
+
     def on_fit_start(self) -> None:
         super().on_fit_start()
         # only used in training
         self.prompt_processor = threestudio.find(self.cfg.prompt_processor_type)(
             self.cfg.prompt_processor
         )
+        # text embeddings are already on the device and do not change during training
+        self.prompt_utils = self.prompt_processor()
 
     def training_step(self, batch, batch_idx):
-        out = self(batch)
-        prompt_utils = self.prompt_processor()
+        # bind frequently used attributes locally to avoid repeated lookups on the module
+        C, log = self.C, self.log
+        lambdas = {name: C(value) for name, value in self.loss_schedules.items()}
+
+        # normals are only needed by the orientation loss
+        need_normal = lambdas["lambda_orient"] > 0
+        if need_normal and self.geometry.cfg.normal_type is None:
+            raise ValueError(
+                "Normal is required for orientation loss, but geometry.normal_type is not set."
+            )
+        out = self(batch, need_normal=need_normal)
         guidance_out = self.guidance(
             out["comp_rgb"],
-            prompt_utils,
+            self.prompt_utils,
             **batch,
             rgb_as_latents=not self.cfg.refinement,
         )
 
-        loss = 0.0
+        # mixed precision is configured through trainer.precision, accumulate in float32
+        loss = torch.zeros((), dtype=torch.float32, device=self.device)
 
         for name, value in guidance_out.items():
-            self.log(f"train/{name}", value)
+            log(f"train/{name}", value)
             if name.startswith("loss_"):
-                loss += value * self.C(self.cfg.loss[name.replace("loss_", "lambda_")])
+                loss = loss + value.float() * lambdas[name.replace("loss_", "lambda_")]
 
-        if self.C(self.cfg.loss.lambda_orient) > 0:
-            if "normal" not in out:
-                raise ValueError(
-                    "Normal is required for orientation loss, no normal is found in the output."
-                )
-            loss_orient = (
-                out["weights"].detach()
-                * dot(out["normal"], out["t_dirs"]).clamp_min(0.0) ** 2
-            ).sum() / (out["opacity"] > 0).sum()
-            self.log("train/loss_orient", loss_orient)
-            loss += loss_orient * self.C(self.cfg.loss.lambda_orient)
-
-        loss_sparsity = (out["opacity"] ** 2 + 0.01).sqrt().mean()
-        self.log("train/loss_sparsity", loss_sparsity)
-        loss += loss_sparsity * self.C(self.cfg.loss.lambda_sparsity)
-
-        opacity_clamped = out["opacity"].clamp(1.0e-3, 1.0 - 1.0e-3)
-        loss_opaque = binary_cross_entropy(opacity_clamped, opacity_clamped)
-        self.log("train/loss_opaque", loss_opaque)
-        loss += loss_opaque * self.C(self.cfg.loss.lambda_opaque)
+        # opacity losses are always logged, but only enter the graph when they are weighted
+        with torch.set_grad_enabled(
+            lambdas["lambda_sparsity"] > 0 or lambdas["lambda_opaque"] > 0
+        ):
+            loss_sparsity, loss_opaque, num_pos = _opacity_losses(out["opacity"])
+        log("train/loss_sparsity", loss_sparsity)
+        if lambdas["lambda_sparsity"] > 0:
+            loss = loss + loss_sparsity.float() * lambdas["lambda_sparsity"]
+        log("train/loss_opaque", loss_opaque)
+        if lambdas["lambda_opaque"] > 0:
+            loss = loss + loss_opaque.float() * lambdas["lambda_opaque"]
+
+        if lambdas["lambda_orient"] > 0:
+            loss_orient = _loss_orient(
+                out["weights"].detach(), out["normal"], out["t_dirs"], num_pos
+            )
+            log("train/loss_orient", loss_orient)
+            loss = loss + loss_orient.float() * lambdas["lambda_orient"]
 
         if (
             self.cfg.guide_shape is not None
-            and self.C(self.cfg.loss.lambda_shape) > 0
+            and lambdas["lambda_shape"] > 0
             and out["points"].shape[0] > 0
         ):
             loss_shape = self.shape_loss(out["points"], out["density"])
-            self.log("train/loss_shape", loss_shape)
-            loss += loss_shape * self.C(self.cfg.loss.lambda_shape)
+            log("train/loss_shape", loss_shape)
+            loss = loss + loss_shape.float() * lambdas["lambda_shape"]
 
-        for name, value in self.cfg.loss.items():
-            self.log(f"train_params/{name}", self.C(value))
+        # only log loss weights on steps that are actually written to the loggers
+        if (self.true_global_step + 1) % self.trainer.log_every_n_steps == 0:
+            self.log_dict(
+                {
+                    f"train_params/{name}": float(value)
+                    for name, value in lambdas.items()
+                }
+            )
 
         return {"loss": loss}
 
     def validation_step(self, batch, batch_idx):
         out = self(batch, decode=True)
-        self.save_image_grid(
+        self.save_image_grid_async(
             f"it{self.true_global_step}-{batch['index'][0]}.png",
             [
                 {
@@ -134,11 +250,11 @@ class LatentNeRF(BaseLift3DSystem):
         )
 
     def on_validation_epoch_end(self):
-        pass
+        self.wait_image_saving()
 
     def test_step(self, batch, batch_idx):
         out = self(batch, decode=True)
-        self.save_image_grid(
+        self.save_image_grid_async(
             f"it{self.true_global_step}-test/{batch['index'][0]}.png",
             [
                 {
@@ -169,7 +285,14 @@ class LatentNeRF(BaseLift3DSystem):
             step=self.true_global_step,
         )
 
+    def teardown(self, stage: str) -> None:
+        if self._save_pool is not None:
+            self._save_pool.shutdown(wait=True)
+            self._save_pool = None
+        super().teardown(stage)
+
     def on_test_epoch_end(self):
+        self.wait_image_saving()
         self.save_img_sequence(
             f"it{self.true_global_step}-test",
             f"it{self.true_global_step}-test",
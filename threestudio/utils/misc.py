@@ -1,6 +1,5 @@
 import gc
 import os
-import re
 
 import tinycudann as tcnn
 import torch
@@ -42,22 +41,18 @@ def load_module_weights(
     state_dict_to_load = state_dict
 
     if ignore_modules is not None:
-        state_dict_to_load = {}
-        for k, v in state_dict.items():
-            ignore = any(
-                [k.startswith(ignore_module + ".") for ignore_module in ignore_modules]
-            )
-            if ignore:
-                continue
-            state_dict_to_load[k] = v
+        ignore_prefixes = tuple(ignore_module + "." for ignore_module in ignore_modules)
+        state_dict_to_load = {
+            k: v for k, v in state_dict.items() if not k.startswith(ignore_prefixes)
+        }
 
     if module_name is not None:
-        state_dict_to_load = {}
-        for k, v in state_dict.items():
-            m = re.match(rf"^{module_name}\.(.*)$", k)
-            if m is None:
-                continue
-            state_dict_to_load[m.group(1)] = v
+        module_prefix = module_name + "."
+        state_dict_to_load = {
+            k[len(module_prefix) :]: v
+            for k, v in state_dict.items()
+            if k.startswith(module_prefix)
+        }
 
     return state_dict_to_load, ckpt["epoch"], ckpt["global_step"]
 
@@ -66,7 +61,8 @@ def C(value: Any, epoch: int, global_step: int) -> float:
     if isinstance(value, int) or isinstance(value, float):
         pass
     else:
-        value = config_to_primitive(value)
+        if not isinstance(value, list):
+            value = config_to_primitive(value)
         if not isinstance(value, list):
             raise TypeError("Scalar specification only supports list, got", type(value))
         if len(value) == 3:
@@ -383,6 +383,24 @@ def ce_pq_loss(p, q, weight=None):
     return ce.sum()
 
 
+@torch.jit.script
+def _shape_occupancy_ce_loss(
+    sigmas: Tensor, mesh_occ: Tensor, weight: Optional[Tensor], delta: float
+) -> Tensor:
+    # scripted version of the tensor part of ShapeLoss, same as
+    # ce_pq_loss((1 - exp(-delta * sigmas)).clamp(0, 1.1), mesh_occ > 0.5, weight)
+    indicator = (mesh_occ > 0.5).float()
+    nerf_occ = (1 - torch.exp(-delta * sigmas)).clamp(min=0.0, max=1.1)
+    nerf_occ = nerf_occ.view(indicator.shape)
+    ce = -1 * (
+        nerf_occ * torch.log(indicator.clamp(0.0001, 1 - 0.0001))
+        + (1 - nerf_occ) * torch.log((1 - indicator).clamp(0.0001, 1 - 0.0001))
+    )
+    if weight is not None:
+        ce = ce * weight
+    return ce.sum()
+
+
 class ShapeLoss(nn.Module):
     def __init__(self, guide_shape):
         super().__init__()
@@ -411,12 +429,8 @@ class ShapeLoss(nn.Module):
             )
         else:
             weight = None
-        indicator = (mesh_occ > 0.5).float()
-        nerf_occ = 1 - torch.exp(-self.delta * sigmas)
-        nerf_occ = nerf_occ.clamp(min=0, max=1.1)
-        loss = ce_pq_loss(
-            nerf_occ, indicator, weight=weight
-        )  # order is important for CE loss + second argument may not be optimized
+        # order is important for CE loss + second argument may not be optimized
+        loss = _shape_occupancy_ce_loss(sigmas, mesh_occ, weight, self.delta)
         return loss
 
 